@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Create simple PNG icons without external dependencies
-Uses pypng or falls back to minimal PNG creation
+Uses pypng + numpy or falls back to minimal PNG creation
 """
 
 def create_simple_png(size, filename):
@@ -11,23 +11,25 @@ def create_simple_png(size, filename):
 
     try:
         import png
-        # Create simple colored square
-        rows = []
-        for y in range(size):
-            row = []
-            for x in range(size):
-                # Add shield shape logic
-                center_x, center_y = size // 2, size // 2
-                dist = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
-                if dist < size // 3:
-                    row.extend([255, 255, 255])  # White center
-                else:
-                    row.extend([r, g, b])  # Blue background
-            rows.append(row)
 
-        with open(filename, 'wb') as f:
-            w = png.Writer(size, size, greyscale=False)
-            w.write(f, rows)
+        # With pypng installed a missing numpy is a broken setup, not a reason
+        # to quietly emit the plain fallback icon
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise RuntimeError("pypng icons need numpy: pip install numpy") from e
+
+        # Add shield shape logic: white disc centred on a blue background
+        center = size // 2
+        ys, xs = np.ogrid[:size, :size]
+        mask = (xs - center) ** 2 + (ys - center) ** 2 < (size // 3) ** 2
+        pixels = np.where(
+            mask[..., None],
+            np.array([255, 255, 255], dtype=np.uint8),  # White center
+            np.array([r, g, b], dtype=np.uint8)  # Blue background
+        )
+
+        png.from_array(pixels.reshape(size, size * 3), 'RGB').save(filename)
         print(f"Created {filename}")
         return True
     except ImportError:
@@ -35,34 +37,26 @@ def create_simple_png(size, filename):
         import struct
         import zlib
 
-        # Create image data (all pixels same color)
-        img_data = b''
-        for y in range(size):
-            img_data += b'\x00'  # Filter type
-            for x in range(size):
-                img_data += bytes([r, g, b])
+        # Create image data (all pixels same color): one filter byte per row
+        row = b'\x00' + bytes((r, g, b)) * size
+        img_data = row * size
 
         # Compress image data
-        compressed = zlib.compress(img_data, 9)
+        compressed = zlib.compress(img_data, 6)
 
         # PNG signature
         png_data = b'\x89PNG\r\n\x1a\n'
 
         # IHDR chunk
-        ihdr = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
-        png_data += struct.pack('>I', 13)
-        png_data += b'IHDR' + ihdr
-        png_data += struct.pack('>I', zlib.crc32(b'IHDR' + ihdr) & 0xffffffff)
+        ihdr_body = b'IHDR' + struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+        png_data += struct.pack('>I', 13) + ihdr_body + struct.pack('>I', zlib.crc32(ihdr_body))
 
         # IDAT chunk
-        png_data += struct.pack('>I', len(compressed))
-        png_data += b'IDAT' + compressed
-        png_data += struct.pack('>I', zlib.crc32(b'IDAT' + compressed) & 0xffffffff)
+        idat_body = b'IDAT' + compressed
+        png_data += struct.pack('>I', len(compressed)) + idat_body + struct.pack('>I', zlib.crc32(idat_body))
 
         # IEND chunk
-        png_data += struct.pack('>I', 0)
-        png_data += b'IEND'
-        png_data += struct.pack('>I', zlib.crc32(b'IEND') & 0xffffffff)
+        png_data += struct.pack('>I', 0) + b'IEND' + struct.pack('>I', zlib.crc32(b'IEND'))
 
         with open(filename, 'wb') as f:
             f.write(png_data)
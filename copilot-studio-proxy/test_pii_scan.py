@@ -0,0 +1,30 @@
+"""Regression tests for PII scanning of text with non-ASCII digits"""
+
+import pytest
+
+import main
+
+
+UNICODE_DIGIT_PII = [
+    ("ssn", "My SSN is １２３-４５-６７８９"),
+    ("ssn", "My SSN is ١٢٣-٤٥-٦٧٨٩"),
+    ("credit_card", "Card: ４１１１ １１１１ １１１１ １１１１"),
+    ("credit_card", "Card: ٤١١١ ١١١١ ١١١١ ١١١١"),
+]
+
+
+@pytest.mark.parametrize("pii_type,text", UNICODE_DIGIT_PII)
+def test_scan_for_pii_finds_unicode_digits(pii_type, text):
+    assert pii_type in main.scan_for_pii(text)
+
+
+@pytest.mark.parametrize("pii_type,text", UNICODE_DIGIT_PII)
+def test_scan_all_finds_unicode_digits(pii_type, text):
+    findings, _ = main.scan_all(text)
+    assert pii_type in findings
+
+
+def test_scan_all_still_reports_ascii_pii_and_keywords():
+    findings, keywords = main.scan_all("Confidential: SSN 123-45-6789")
+    assert findings["ssn"] == ["123-45-6789"]
+    assert keywords == ["confidential"]
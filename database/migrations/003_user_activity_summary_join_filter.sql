@@ -0,0 +1,29 @@
+-- Rebuild user activity view so per-user lookups stay index-bound
+
+-- The 30-day window used to sit in the WHERE clause as
+-- "d.timestamp > ... OR d.timestamp IS NULL", which the planner cannot use as
+-- an index condition, so every decision a user ever made was read and then
+-- discarded. Filtering in the join lets idx_decisions_user (user_email,
+-- timestamp DESC) scan only the last 30 days, and users whose activity is all
+-- older than that now appear with zero counts instead of disappearing.
+DROP VIEW IF EXISTS user_activity_summary;
+
+CREATE VIEW user_activity_summary AS
+SELECT
+    u.user_id,
+    u.email,
+    u.first_name,
+    u.last_name,
+    u.department,
+    COALESCE(u.iam_provider, 'local') as iam_provider,
+    COUNT(d.decision_id) as total_requests,
+    COUNT(d.decision_id) FILTER (WHERE d.decision = 'ALLOW') as allowed_requests,
+    COUNT(d.decision_id) FILTER (WHERE d.decision = 'DENY') as denied_requests,
+    AVG(d.risk_score) as avg_risk_score,
+    MAX(d.timestamp) as last_activity,
+    u.last_seen_at
+FROM users u
+LEFT JOIN decisions d
+    ON u.email = d.user_email
+    AND d.timestamp > NOW() - INTERVAL '30 days'
+GROUP BY u.user_id, u.email, u.first_name, u.last_name, u.department, u.iam_provider, u.last_seen_at;
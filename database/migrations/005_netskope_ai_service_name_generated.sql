@@ -0,0 +1,107 @@
+-- Derive netskope_logs.ai_service_name in the database
+
+-- The ingest path used to send "app if is_ai_service else None" for every
+-- row; computing it from the row itself removes a bound value per log and
+-- guarantees the two columns can never disagree.
+
+-- unified_ai_detections selects the column and cloud_ai_usage_summary is
+-- built on that view, so both are dropped and recreated around the swap.
+BEGIN;
+
+DROP VIEW IF EXISTS cloud_ai_usage_summary;
+DROP VIEW IF EXISTS unified_ai_detections;
+
+ALTER TABLE netskope_logs DROP COLUMN IF EXISTS ai_service_name;
+
+ALTER TABLE netskope_logs ADD COLUMN ai_service_name VARCHAR(255)
+    GENERATED ALWAYS AS (CASE WHEN is_ai_service THEN app END) STORED;
+
+CREATE VIEW unified_ai_detections AS
+-- Zscaler detections
+SELECT
+    detection_id,
+    timestamp,
+    user_email,
+    user_department,
+    ai_service_domain AS service_identifier,
+    ai_service_name AS service_name,
+    'zscaler' AS source,
+    action_taken AS action,
+    risk_level,
+    has_sensitive_data,
+    metadata
+FROM zscaler_ai_detections
+
+UNION ALL
+
+-- Google Workspace AI service usage
+SELECT
+    log_id AS detection_id,
+    timestamp,
+    user_email,
+    user_department,
+    ai_service_name AS service_identifier,
+    ai_service_name AS service_name,
+    'google_workspace' AS source,
+    activity_type AS action,
+    'medium' AS risk_level,
+    FALSE AS has_sensitive_data,
+    raw_log AS metadata
+FROM google_workspace_logs
+WHERE is_ai_service = TRUE
+
+UNION ALL
+
+-- AWS AI/ML service usage
+SELECT
+    log_id AS detection_id,
+    timestamp,
+    user_email,
+    user_department,
+    ai_service_name AS service_identifier,
+    ai_service_name AS service_name,
+    'aws_cloudtrail' AS source,
+    event_name AS action,
+    'medium' AS risk_level,
+    FALSE AS has_sensitive_data,
+    raw_log AS metadata
+FROM aws_cloudtrail_logs
+WHERE is_ai_service = TRUE
+
+UNION ALL
+
+-- Netskope AI service detections
+SELECT
+    log_id AS detection_id,
+    timestamp,
+    user_email,
+    user_department,
+    ai_service_name AS service_identifier,
+    ai_service_name AS service_name,
+    'netskope' AS source,
+    action,
+    CASE
+        WHEN action = 'block' THEN 'high'
+        WHEN dlp_incident_id IS NOT NULL THEN 'high'
+        ELSE 'medium'
+    END AS risk_level,
+    dlp_incident_id IS NOT NULL AS has_sensitive_data,
+    raw_log AS metadata
+FROM netskope_logs
+WHERE is_ai_service = TRUE;
+
+CREATE VIEW cloud_ai_usage_summary AS
+SELECT
+    source,
+    service_name,
+    COUNT(*) AS total_detections,
+    COUNT(DISTINCT user_email) AS unique_users,
+    COUNT(*) FILTER (WHERE has_sensitive_data = TRUE) AS with_sensitive_data,
+    COUNT(*) FILTER (WHERE risk_level IN ('high', 'critical')) AS high_risk_count,
+    MAX(timestamp) AS last_seen
+FROM unified_ai_detections
+WHERE timestamp > NOW() - INTERVAL '30 days'
+GROUP BY source, service_name
+ORDER BY total_detections DESC;
+
+COMMIT;
@@ -0,0 +1,20 @@
+-- Retention for raw Netskope logs
+
+-- netskope_logs is already a hypertable in 1-day chunks, so time-filtered
+-- queries only touch the chunks in range. Expire old data by dropping whole
+-- chunks instead of DELETE, matching the decisions table.
+
+-- Raw DLP/malware logs are audit evidence, so the window never drops below
+-- the longest compliance preset (2555 days, 7 years). A longer window can be
+-- set before running this migration with:
+--   ALTER DATABASE <db> SET aigov.netskope_log_retention_days = '<days>';
+DO $$
+DECLARE
+    retention_days INTEGER := GREATEST(
+        COALESCE(NULLIF(current_setting('aigov.netskope_log_retention_days', true), '')::INTEGER, 0),
+        2555
+    );
+BEGIN
+    PERFORM remove_retention_policy('netskope_logs', if_exists => true);
+    PERFORM add_retention_policy('netskope_logs', make_interval(days => retention_days));
+END $$;
@@ -0,0 +1,7 @@
+-- Compress Netskope raw_log payloads with LZ4
+
+-- raw_log is never read by the stats queries, but large payloads are TOASTed
+-- with pglz, which is slow to compress on ingest. LZ4 (PostgreSQL 14+) is
+-- several times faster at a similar ratio; existing rows keep pglz until
+-- they are rewritten.
+ALTER TABLE netskope_logs ALTER COLUMN raw_log SET COMPRESSION lz4;
@@ -3,11 +3,16 @@ AI Guardrails API
 F5-equivalent runtime security for AI models
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import Counter
+from itertools import islice
+import orjson
 
+from app.cache import async_ttl_cache
 from app.guardrails.risk_assessment import (
     get_risk_assessor,
     RiskAssessmentResult,
@@ -45,7 +50,7 @@ from app.guardrails.presets import (
     IndustryVertical
 )
 
-router = APIRouter(prefix="/api/guardrails", tags=["AI Guardrails"])
+router = APIRouter(prefix="/api/guardrails", tags=["AI Guardrails"], default_response_class=ORJSONResponse)
 
 
 # ==========================================
@@ -369,54 +374,47 @@ async def get_threat_report(
     """
     red_team = get_red_team()
 
-    start_date = datetime.utcnow() - __import__('datetime').timedelta(days=days)
+    start_date = datetime.utcnow() - timedelta(days=days)
     report = red_team.get_threat_report(start_date=start_date)
 
-    return report
+    # Serialize the already-valid report directly instead of re-validating it
+    return Response(report.model_dump_json(), media_type="application/json")
 
 
 @router.get("/threats/vectors")
 async def get_attack_vectors():
     """Get statistics for all known attack vectors"""
+    return Response(await _attack_vectors_json(), media_type="application/json")
+
+
+@async_ttl_cache(ttl=10)
+async def _attack_vectors_json() -> bytes:
+    """Serialized attack vector stats; cached briefly because dashboards poll them"""
     red_team = get_red_team()
-    return {
+    return orjson.dumps({
         "attack_vectors": red_team.get_attack_vector_stats(),
         "total_vectors": len(red_team.attack_vectors),
-        "timestamp": datetime.utcnow().isoformat()
-    }
+        "timestamp": datetime.utcnow()
+    })
 
 
 @router.get("/threats/incidents")
 async def get_recent_incidents(
-    limit: int = Query(50, description="Maximum number of incidents to return")
+    limit: int = Query(50, ge=0, description="Maximum number of incidents to return")
 ):
     """Get recent security incidents"""
     red_team = get_red_team()
 
-    # Get most recent incidents
-    incidents = sorted(
-        red_team.incidents,
-        key=lambda x: x.timestamp,
-        reverse=True
-    )[:limit]
+    # Incidents are stored oldest-first, so the most recent are at the tail
+    incidents = list(islice(reversed(red_team.incident_summaries), limit))
 
-    return {
-        "incidents": [
-            {
-                "incident_id": inc.incident_id,
-                "timestamp": inc.timestamp.isoformat(),
-                "user_email": inc.user_email,
-                "threat_category": inc.threat_category.value,
-                "threat_level": inc.threat_level.value,
-                "attack_vector": inc.attack_vector,
-                "blocked": inc.blocked,
-                "investigation_status": inc.investigation_status
-            }
-            for inc in incidents
-        ],
-        "total_incidents": len(red_team.incidents),
+    return ORJSONResponse({
+        "incidents": incidents,
+        "total_incidents": red_team.total_incidents,
+        # Only the most recent MAX_INCIDENTS are kept in memory
+        "retained_incidents": len(red_team.incidents),
         "returned": len(incidents)
-    }
+    })
 
 
 # ==========================================
@@ -459,7 +457,7 @@ async def list_presets(
         industry=industry_enum
     )
 
-    return [
+    return ORJSONResponse([
         {
             "preset_id": p.preset_id,
             "name": p.name,
@@ -471,7 +469,7 @@ async def list_presets(
             "recommended_for": p.recommended_for
         }
         for p in presets
-    ]
+    ])
 
 
 @router.get("/presets/{preset_id}", response_model=ModelPreset)
@@ -483,7 +481,8 @@ async def get_preset(preset_id: str):
     if not preset:
         raise HTTPException(status_code=404, detail=f"Preset not found: {preset_id}")
 
-    return preset
+    # Presets are built in-process, so serialize without re-validating
+    return Response(preset.model_dump_json(), media_type="application/json")
 
 
 # ==========================================
@@ -497,22 +496,29 @@ async def get_dashboard_summary():
 
     Includes statistics from all guardrail systems
     """
-    risk_assessor = get_risk_assessor()
-    content_moderator = get_content_moderator()
+    return Response(await _dashboard_summary_json(), media_type="application/json")
+
+
+@async_ttl_cache(ttl=10)
+async def _dashboard_summary_json() -> bytes:
+    """Serialized dashboard summary; cached briefly because dashboards poll it"""
     red_team = get_red_team()
     router_instance = get_model_router()
 
+    now = datetime.utcnow()
+
     # Get threat statistics
     recent_threats = red_team.get_threat_report(
-        start_date=datetime.utcnow() - __import__('datetime').timedelta(days=1)
+        start_date=now - timedelta(days=1),
+        end_date=now
     )
 
     # Get model health
     models_status = router_instance.get_all_models_status()
-    healthy_models = len([m for m in models_status if m.get("status") == "HEALTHY"])
+    status_counts = Counter(m.get("status") for m in models_status)
 
-    return {
-        "timestamp": datetime.utcnow().isoformat(),
+    return orjson.dumps({
+        "timestamp": now,
         "threats": {
             "last_24h": recent_threats.total_threats_detected,
             "blocked": recent_threats.blocked_attacks,
@@ -521,26 +527,33 @@ async def get_dashboard_summary():
         },
         "models": {
             "total": len(models_status),
-            "healthy": healthy_models,
-            "degraded": len([m for m in models_status if m.get("status") == "DEGRADED"]),
-            "unavailable": len([m for m in models_status if m.get("status") == "UNAVAILABLE"])
+            "healthy": status_counts["HEALTHY"],
+            "degraded": status_counts["DEGRADED"],
+            "unavailable": status_counts["UNAVAILABLE"]
         },
         "recommendations": recent_threats.recommendations
-    }
+    })
+
+
+# Only the timestamp changes between health checks, so serialize the rest once
+_HEALTH_TEMPLATE = orjson.dumps({
+    "status": "healthy",
+    "components": {
+        "risk_assessment": "operational",
+        "content_moderation": "operational",
+        "model_routing": "operational",
+        "compliance": "operational",
+        "red_team": "operational",
+        "presets": "operational"
+    },
+    "timestamp": "%s"
+})
 
 
 @router.get("/health")
 async def guardrails_health():
     """Health check for guardrails system"""
-    return {
-        "status": "healthy",
-        "components": {
-            "risk_assessment": "operational",
-            "content_moderation": "operational",
-            "model_routing": "operational",
-            "compliance": "operational",
-            "red_team": "operational",
-            "presets": "operational"
-        },
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return Response(
+        _HEALTH_TEMPLATE % datetime.utcnow().isoformat().encode(),
+        media_type="application/json"
+    )
@@ -3,15 +3,17 @@ IAM API Endpoints
 User management, sync, and authentication
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, AsyncIterator
 from datetime import datetime
 import asyncpg
 
 from app.auth.providers import iam_manager, get_current_user
+from app.cache import async_ttl_cache
 
-router = APIRouter(prefix="/api/iam", tags=["IAM"])
+router = APIRouter(prefix="/api/iam", tags=["IAM"], default_response_class=ORJSONResponse)
 
 # Global database pool (injected at startup)
 db_pool: Optional[asyncpg.Pool] = None
@@ -22,6 +24,37 @@ def set_db_pool(pool: asyncpg.Pool):
     db_pool = pool
 
 
+# Shared by the per-provider test endpoints so both hit one cached prepared statement
+PROVIDER_STATS_SQL = """
+    SELECT COUNT(*) AS user_count, MAX(iam_synced_at) AS last_sync
+    FROM users WHERE iam_provider = $1
+"""
+
+
+# Exactly the UserResponse fields, so list rows can be serialized as-is
+USER_RESPONSE_COLUMNS = """
+    user_id, email, first_name, last_name, department,
+    COALESCE(groups, '{}') AS groups,
+    iam_provider, iam_synced_at, last_seen_at, status
+"""
+
+# One statement text for every filter combination, so it stays in asyncpg's
+# statement cache; rows are rendered as JSON text by Postgres
+LIST_USERS_SQL = f"""
+    SELECT row_to_json(u)::text FROM (
+        SELECT {USER_RESPONSE_COLUMNS} FROM users
+        WHERE ($1::text IS NULL OR department = $1)
+          AND ($2::text IS NULL OR iam_provider = $2)
+        ORDER BY email LIMIT $3 OFFSET $4
+    ) u ORDER BY u.email
+"""
+
+
+def _model_response(model: BaseModel) -> Response:
+    """Serialize a trusted model directly, skipping response_model re-validation"""
+    return Response(model.model_dump_json(), media_type="application/json")
+
+
 # ==========================================
 # DATA MODELS
 # ==========================================
@@ -75,26 +108,34 @@ async def get_iam_status() -> IAMStatusResponse:
     if not db_pool:
         raise HTTPException(status_code=503, detail="Database not available")
 
+    return await _load_iam_status()
+
+
+@async_ttl_cache(ttl=10)
+async def _load_iam_status() -> IAMStatusResponse:
+    """Build the IAM status; cached briefly because dashboards poll it"""
     # Get total users and last sync time
     async with db_pool.acquire() as conn:
-        total_users = await conn.fetchval("SELECT COUNT(*) FROM users")
-        last_sync = await conn.fetchval("SELECT MAX(iam_synced_at) FROM users")
+        stats = await conn.fetchrow("""
+            SELECT COUNT(*) AS total_users, MAX(iam_synced_at) AS last_sync FROM users
+        """)
+    total_users, last_sync = stats["total_users"], stats["last_sync"]
 
     return IAMStatusResponse(
         enabled_providers=iam_manager.get_enabled_providers(),
-        okta_configured="okta" in iam_manager.enabled_providers,
-        entra_id_configured="entra_id" in iam_manager.enabled_providers,
+        okta_configured=iam_manager.okta_enabled,
+        entra_id_configured=iam_manager.entra_id_enabled,
         total_users=total_users or 0,
         last_sync=last_sync
     )
 
 
-@router.post("/sync-user")
+@router.post("/sync-user", response_model=UserResponse)
 async def sync_user(
     request: UserSyncRequest,
     background_tasks: BackgroundTasks,
     current_user: Dict = Depends(get_current_user)
-) -> UserResponse:
+):
     """
     Sync a user from IAM provider to local database
     Requires authentication
@@ -103,15 +144,10 @@ async def sync_user(
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        user_data = await iam_manager.sync_user(request.user_id, request.provider, db_pool)
+        # The upsert returns the full stored row, so no refetch is needed
+        user_record = await iam_manager.sync_user(request.user_id, request.provider, db_pool)
 
-        # Fetch from database to get full record
-        async with db_pool.acquire() as conn:
-            user_record = await conn.fetchrow("""
-                SELECT * FROM users WHERE user_id = $1
-            """, request.user_id)
-
-        return UserResponse(
+        return _model_response(UserResponse.model_construct(
             user_id=user_record["user_id"],
             email=user_record["email"],
             first_name=user_record["first_name"],
@@ -122,7 +158,7 @@ async def sync_user(
             iam_synced_at=user_record["iam_synced_at"],
             last_seen_at=user_record["last_seen_at"],
             status=user_record["status"]
-        )
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"User sync failed: {str(e)}")
 
@@ -149,56 +185,40 @@ async def sync_all_users(
     }
 
 
-@router.get("/users")
+@router.get("/users", response_model=List[UserResponse])
 async def list_users(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     department: Optional[str] = None,
     provider: Optional[str] = None,
     current_user: Dict = Depends(get_current_user)
-) -> List[UserResponse]:
+):
     """List all synchronized users"""
     if not db_pool:
         raise HTTPException(status_code=503, detail="Database not available")
 
-    query = "SELECT * FROM users WHERE 1=1"
-    params = []
-
-    if department:
-        params.append(department)
-        query += f" AND department = ${len(params)}"
-
-    if provider:
-        params.append(provider)
-        query += f" AND iam_provider = ${len(params)}"
+    params = (department or None, provider or None, limit, skip)
 
-    query += f" ORDER BY email LIMIT {limit} OFFSET {skip}"
-
-    async with db_pool.acquire() as conn:
-        users = await conn.fetch(query, *params)
+    async def stream_rows() -> AsyncIterator[bytes]:
+        # Rows are written as the cursor prefetches them instead of being
+        # materialized first
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                yield b"["
+                separator = b""
+                async for user in conn.cursor(LIST_USERS_SQL, *params):
+                    yield separator + user[0].encode()
+                    separator = b","
+                yield b"]"
 
-    return [
-        UserResponse(
-            user_id=user["user_id"],
-            email=user["email"],
-            first_name=user["first_name"],
-            last_name=user["last_name"],
-            department=user["department"],
-            groups=user["groups"] or [],
-            iam_provider=user["iam_provider"],
-            iam_synced_at=user["iam_synced_at"],
-            last_seen_at=user["last_seen_at"],
-            status=user["status"]
-        )
-        for user in users
-    ]
+    return StreamingResponse(stream_rows(), media_type="application/json")
 
 
-@router.get("/users/{email}")
+@router.get("/users/{email}", response_model=UserResponse)
 async def get_user(
     email: str,
     current_user: Dict = Depends(get_current_user)
-) -> UserResponse:
+):
     """Get user details by email"""
     if not db_pool:
         raise HTTPException(status_code=503, detail="Database not available")
@@ -209,7 +229,7 @@ async def get_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return UserResponse(
+    return _model_response(UserResponse.model_construct(
         user_id=user["user_id"],
         email=user["email"],
         first_name=user["first_name"],
@@ -220,14 +240,14 @@ async def get_user(
         iam_synced_at=user["iam_synced_at"],
         last_seen_at=user["last_seen_at"],
         status=user["status"]
-    )
+    ))
 
 
-@router.get("/users/{email}/activity")
+@router.get("/users/{email}/activity", response_model=UserActivityResponse)
 async def get_user_activity(
     email: str,
     current_user: Dict = Depends(get_current_user)
-) -> UserActivityResponse:
+):
     """Get user activity summary"""
     if not db_pool:
         raise HTTPException(status_code=503, detail="Database not available")
@@ -240,7 +260,7 @@ async def get_user_activity(
     if not activity:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return UserActivityResponse(
+    return _model_response(UserActivityResponse.model_construct(
         user_id=activity["user_id"],
         email=activity["email"],
         first_name=activity["first_name"],
@@ -251,7 +271,7 @@ async def get_user_activity(
         denied_requests=activity["denied_requests"] or 0,
         avg_risk_score=float(activity["avg_risk_score"]) if activity["avg_risk_score"] else None,
         last_activity=activity["last_activity"]
-    )
+    ))
 
 
 @router.get("/departments")
@@ -322,7 +342,7 @@ async def test_okta_connection():
             })
 
             # Check if Okta is enabled
-            okta_enabled = "okta" in iam_manager.enabled_providers
+            okta_enabled = iam_manager.okta_enabled
 
             if not okta_enabled:
                 test_results["tests"].append({
@@ -340,13 +360,8 @@ async def test_okta_connection():
             })
 
             # Check Okta users
-            okta_users = await conn.fetchval("""
-                SELECT COUNT(*) FROM users WHERE iam_provider = 'okta'
-            """)
-
-            last_sync = await conn.fetchval("""
-                SELECT MAX(iam_synced_at) FROM users WHERE iam_provider = 'okta'
-            """)
+            provider_stats = await conn.fetchrow(PROVIDER_STATS_SQL, "okta")
+            okta_users, last_sync = provider_stats["user_count"], provider_stats["last_sync"]
 
             test_results["tests"].append({
                 "name": "Okta User Sync",
@@ -417,7 +432,7 @@ async def test_entra_id_connection():
             })
 
             # Check if Entra ID is enabled
-            entra_enabled = "entra_id" in iam_manager.enabled_providers
+            entra_enabled = iam_manager.entra_id_enabled
 
             if not entra_enabled:
                 test_results["tests"].append({
@@ -435,13 +450,8 @@ async def test_entra_id_connection():
             })
 
             # Check Entra ID users
-            entra_users = await conn.fetchval("""
-                SELECT COUNT(*) FROM users WHERE iam_provider = 'entra_id'
-            """)
-
-            last_sync = await conn.fetchval("""
-                SELECT MAX(iam_synced_at) FROM users WHERE iam_provider = 'entra_id'
-            """)
+            provider_stats = await conn.fetchrow(PROVIDER_STATS_SQL, "entra_id")
+            entra_users, last_sync = provider_stats["user_count"], provider_stats["last_sync"]
 
             test_results["tests"].append({
                 "name": "Entra ID User Sync",
@@ -511,8 +521,17 @@ async def test_iam_connection():
                 "message": "Successfully connected to database"
             })
 
-            # Check users table
-            user_count = await conn.fetchval("SELECT COUNT(*) FROM users")
+            # Check users table; per-provider stats come back in the same round trip
+            user_stats = await conn.fetchrow("""
+                SELECT
+                    COUNT(*) AS total,
+                    COUNT(*) FILTER (WHERE iam_provider = 'okta') AS okta_users,
+                    MAX(iam_synced_at) FILTER (WHERE iam_provider = 'okta') AS okta_sync,
+                    COUNT(*) FILTER (WHERE iam_provider = 'entra_id') AS entra_users,
+                    MAX(iam_synced_at) FILTER (WHERE iam_provider = 'entra_id') AS entra_sync
+                FROM users
+            """)
+            user_count = user_stats["total"]
             test_results["tests"].append({
                 "name": "Users Table",
                 "status": "passed",
@@ -520,15 +539,11 @@ async def test_iam_connection():
             })
 
             # Test Okta configuration
-            okta_enabled = "okta" in iam_manager.enabled_providers
+            okta_enabled = iam_manager.okta_enabled
             if okta_enabled:
                 try:
-                    okta_users = await conn.fetchval("""
-                        SELECT COUNT(*) FROM users WHERE iam_provider = 'okta'
-                    """)
-                    last_sync = await conn.fetchval("""
-                        SELECT MAX(iam_synced_at) FROM users WHERE iam_provider = 'okta'
-                    """)
+                    okta_users = user_stats["okta_users"]
+                    last_sync = user_stats["okta_sync"]
 
                     test_results["providers"]["okta"] = {
                         "enabled": True,
@@ -560,15 +575,11 @@ async def test_iam_connection():
                 })
 
             # Test Entra ID configuration
-            entra_enabled = "entra_id" in iam_manager.enabled_providers
+            entra_enabled = iam_manager.entra_id_enabled
             if entra_enabled:
                 try:
-                    entra_users = await conn.fetchval("""
-                        SELECT COUNT(*) FROM users WHERE iam_provider = 'entra_id'
-                    """)
-                    last_sync = await conn.fetchval("""
-                        SELECT MAX(iam_synced_at) FROM users WHERE iam_provider = 'entra_id'
-                    """)
+                    entra_users = user_stats["entra_users"]
+                    last_sync = user_stats["entra_sync"]
 
                     test_results["providers"]["entra_id"] = {
                         "enabled": True,
@@ -610,7 +621,7 @@ async def test_iam_connection():
             test_results["success"] = all_passed
             test_results["summary"] = f"{sum(1 for t in test_results['tests'] if t['status'] == 'passed')}/{len(test_results['tests'])} tests passed"
 
-            return test_results
+            return ORJSONResponse(test_results)
 
     except Exception as e:
         test_results["tests"].append({
@@ -618,4 +629,4 @@ async def test_iam_connection():
             "status": "failed",
             "message": f"Error during testing: {str(e)}"
         })
-        return test_results
+        return ORJSONResponse(test_results)
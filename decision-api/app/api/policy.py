@@ -3,18 +3,39 @@ Policy Management API
 Handles active policy selection and persistence
 """
 
+import asyncio
+import contextlib
+import logging
+import re
+import uuid
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from pathlib import Path
-import json
+import orjson
 from datetime import datetime
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 # Path to store active policy configuration
 BASE_DIR = Path(__file__).parent.parent.parent
 ACTIVE_POLICY_FILE = BASE_DIR / "data" / "active_policy.json"
 POLICIES_DIR = BASE_DIR.parent / "policies"
+STARTER_TEMPLATES_DIR = POLICIES_DIR / "starter_templates"
+
+# Admin overrides: overrides.json holds the last compacted snapshot and
+# overrides.jsonl the changes made since, one JSON object per line
+OVERRIDES_FILE = Path("/app/data/overrides.json")
+OVERRIDES_JOURNAL = OVERRIDES_FILE.with_suffix(".jsonl")
+OVERRIDES_COMPACT_INTERVAL = 60  # seconds
+
+_overrides_cache = None
+_overrides_dirty = False
+_compactor_task = None
+
+# Policy files above this size are read on a worker thread
+LARGE_POLICY_FILE_BYTES = 64 * 1024
 
 class PolicyConfig(BaseModel):
     policy_name: str
@@ -35,9 +56,8 @@ ACTIVE_POLICY_FILE.parent.mkdir(parents=True, exist_ok=True)
 def get_active_policy() -> PolicyConfig:
     """Load the currently active policy configuration"""
     if ACTIVE_POLICY_FILE.exists():
-        with open(ACTIVE_POLICY_FILE, 'r') as f:
-            data = json.load(f)
-            return PolicyConfig(**data)
+        data = orjson.loads(ACTIVE_POLICY_FILE.read_bytes())
+        return PolicyConfig(**data)
     else:
         # Default to balanced policy
         return PolicyConfig(
@@ -49,8 +69,13 @@ def get_active_policy() -> PolicyConfig:
 
 def save_active_policy(config: PolicyConfig):
     """Save the active policy configuration"""
-    with open(ACTIVE_POLICY_FILE, 'w') as f:
-        json.dump(config.dict(), f, indent=2)
+    ACTIVE_POLICY_FILE.write_bytes(orjson.dumps(config.model_dump(), option=orjson.OPT_INDENT_2))
+
+async def read_policy_file(policy_path: Path) -> str:
+    """Read a policy file, offloading only large files from the event loop"""
+    if policy_path.stat().st_size > LARGE_POLICY_FILE_BYTES:
+        return await asyncio.to_thread(policy_path.read_text)
+    return policy_path.read_text()
 
 @router.get("/api/policy/active")
 async def get_current_policy():
@@ -58,7 +83,7 @@ async def get_current_policy():
     config = get_active_policy()
 
     # Read the policy file content
-    policy_path = POLICIES_DIR / "starter_templates" / config.policy_file
+    policy_path = STARTER_TEMPLATES_DIR / config.policy_file
 
     # Try main policies directory first
     if not policy_path.exists():
@@ -66,8 +91,7 @@ async def get_current_policy():
 
     policy_content = ""
     if policy_path.exists():
-        with open(policy_path, 'r') as f:
-            policy_content = f.read()
+        policy_content = await read_policy_file(policy_path)
 
     return {
         "config": config,
@@ -80,7 +104,7 @@ async def activate_policy(config: PolicyConfig):
     """Set a policy as the active policy"""
 
     # Validate policy file exists
-    policy_path = POLICIES_DIR / "starter_templates" / config.policy_file
+    policy_path = STARTER_TEMPLATES_DIR / config.policy_file
 
     if not policy_path.exists():
         policy_path = POLICIES_DIR / config.policy_file
@@ -102,49 +126,74 @@ async def activate_policy(config: PolicyConfig):
         "config": config
     }
 
+# Template metadata lines: "# Use Case: ...", "# Description: ...", "# <name> Policy".
+# The labelled lines come first so a label whose value mentions "Policy" is
+# not taken for the name.
+TEMPLATE_METADATA_RE = re.compile(
+    r"^#\s*Use Case:(?P<use_case>.*)$|^#\s*Description:(?P<description>.*)$|^# (?P<name>.*Policy.*)$",
+    re.MULTILINE
+)
+
+# Parsed template entries keyed by path, reused while the file's mtime is unchanged
+_TEMPLATE_CACHE: dict = {}
+
+def _parse_starter_template(policy_file: Path, full_content: str) -> dict:
+    """Build a template entry from the metadata in the first few comment lines"""
+    name = "Unknown Policy"
+    use_case = ""
+    description = ""
+
+    header = "\n".join(full_content.split("\n", 10)[:10])
+    for match in TEMPLATE_METADATA_RE.finditer(header):
+        if match["use_case"] is not None:
+            use_case = match["use_case"].strip()
+        elif match["description"] is not None:
+            description = match["description"].strip()
+        elif name == "Unknown Policy":
+            name = match["name"].replace("#", "").strip()
+
+    return {
+        "filename": policy_file.name,
+        "name": name,
+        "use_case": use_case,
+        "description": description,
+        "content": full_content
+    }
+
+def _parse_custom_policy(policy_file: Path, full_content: str) -> dict:
+    """Build a template entry for a user-defined policy"""
+    return {
+        "filename": policy_file.name,
+        "name": policy_file.stem.replace("_", " ").title(),
+        "use_case": "Custom Policy",
+        "description": "User-defined policy",
+        "content": full_content
+    }
+
+def _cached_template(policy_file: Path, parse) -> dict:
+    """Return the parsed entry for a policy file, re-reading it only after it changes"""
+    mtime_ns = policy_file.stat().st_mtime_ns
+    cached = _TEMPLATE_CACHE.get(policy_file)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    entry = parse(policy_file, policy_file.read_text())
+    _TEMPLATE_CACHE[policy_file] = (mtime_ns, entry)
+    return entry
+
 @router.get("/api/policy/templates")
 async def list_policy_templates():
     """List all available policy templates"""
     templates = []
 
-    templates_dir = POLICIES_DIR / "starter_templates"
-    if templates_dir.exists():
-        for policy_file in templates_dir.glob("*.rego"):
-            # Read first few lines to get metadata
-            with open(policy_file, 'r') as f:
-                lines = f.readlines()[:10]
-                full_content = policy_file.read_text()
-                name = "Unknown Policy"
-                use_case = ""
-                description = ""
-
-                for line in lines:
-                    if line.startswith("# ") and "Policy" in line and name == "Unknown Policy":
-                        name = line.replace("#", "").strip()
-                    elif "Use Case:" in line:
-                        use_case = line.split("Use Case:")[1].strip()
-                    elif "Description:" in line:
-                        description = line.split("Description:")[1].strip()
-
-            templates.append({
-                "filename": policy_file.name,
-                "name": name,
-                "use_case": use_case,
-                "description": description,
-                "content": full_content
-            })
+    if STARTER_TEMPLATES_DIR.exists():
+        for policy_file in STARTER_TEMPLATES_DIR.glob("*.rego"):
+            templates.append(_cached_template(policy_file, _parse_starter_template))
 
     # Also check main policies directory
     if POLICIES_DIR.exists():
         for policy_file in POLICIES_DIR.glob("*.rego"):
-            full_content = policy_file.read_text()
-            templates.append({
-                "filename": policy_file.name,
-                "name": policy_file.stem.replace("_", " ").title(),
-                "use_case": "Custom Policy",
-                "description": "User-defined policy",
-                "content": full_content
-            })
+            templates.append(_cached_template(policy_file, _parse_custom_policy))
 
     return {"templates": templates}
 
@@ -152,7 +201,7 @@ async def list_policy_templates():
 async def get_policy_template(filename: str):
     """Get a specific policy template content"""
     # Check starter templates first
-    policy_path = POLICIES_DIR / "starter_templates" / filename
+    policy_path = STARTER_TEMPLATES_DIR / filename
 
     if not policy_path.exists():
         # Check main policies directory
@@ -161,39 +210,108 @@ async def get_policy_template(filename: str):
     if not policy_path.exists():
         raise HTTPException(status_code=404, detail=f"Policy template not found: {filename}")
 
-    content = policy_path.read_text()
+    content = await read_policy_file(policy_path)
     return {
         "filename": filename,
         "content": content
     }
 
+def _load_overrides() -> list:
+    """Rebuild the override list from the last snapshot plus the journal"""
+    if OVERRIDES_FILE.exists():
+        overrides = orjson.loads(OVERRIDES_FILE.read_bytes())["allowed_services"]
+    else:
+        overrides = []
+
+    if OVERRIDES_JOURNAL.exists():
+        for line in OVERRIDES_JOURNAL.read_bytes().splitlines():
+            if not line:
+                continue
+            record = orjson.loads(line)
+            if record["op"] == "add":
+                # Skip adds already folded into the snapshot: a crash between
+                # replacing overrides.json and deleting the journal replays it
+                override = record["override"]
+                if not any(o.get("id") == override["id"] for o in overrides):
+                    overrides.append(override)
+            elif record["op"] == "remove":
+                overrides = [o for o in overrides if o["domain"] != record["domain"]]
+
+    return overrides
+
+def _get_overrides() -> list:
+    """Process-resident override list, loaded from disk on first use"""
+    global _overrides_cache, _overrides_dirty
+    if _overrides_cache is None:
+        _overrides_cache = _load_overrides()
+        _overrides_dirty = OVERRIDES_JOURNAL.exists()
+    return _overrides_cache
+
+def _append_override_journal(record: dict):
+    """Persist a single override change as one JSON line"""
+    global _overrides_dirty
+    with open(OVERRIDES_JOURNAL, "ab") as f:
+        f.write(orjson.dumps(record) + b"\n")
+    _overrides_dirty = True
+
+def compact_overrides():
+    """Fold the journal into overrides.json and start a fresh journal"""
+    global _overrides_dirty
+    if not _overrides_dirty or _overrides_cache is None:
+        return
+
+    tmp_file = OVERRIDES_FILE.with_suffix(".json.tmp")
+    tmp_file.write_bytes(orjson.dumps(
+        {"allowed_services": _overrides_cache}, option=orjson.OPT_INDENT_2
+    ))
+    tmp_file.replace(OVERRIDES_FILE)
+    OVERRIDES_JOURNAL.unlink(missing_ok=True)
+    _overrides_dirty = False
+
+async def _compact_overrides_periodically():
+    while True:
+        await asyncio.sleep(OVERRIDES_COMPACT_INTERVAL)
+        try:
+            compact_overrides()
+        except Exception:
+            logger.exception("Error compacting overrides")
+
+def start_overrides_compactor():
+    """Start the background task that compacts the overrides journal"""
+    global _compactor_task
+    if _compactor_task is None:
+        _compactor_task = asyncio.create_task(_compact_overrides_periodically())
+
+async def stop_overrides_compactor():
+    """Stop the compactor and write a final snapshot"""
+    global _compactor_task
+    if _compactor_task:
+        _compactor_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _compactor_task
+        _compactor_task = None
+
+    compact_overrides()
+
 @router.post("/api/overrides")
 async def create_override(override: PolicyOverride):
     """Create an admin override to allow a blocked service"""
 
-    # Path to store overrides
-    overrides_file = Path("/app/data/overrides.json")
-
-    # Load existing overrides
-    if overrides_file.exists():
-        with open(overrides_file, 'r') as f:
-            overrides = json.load(f)
-    else:
-        overrides = {"allowed_services": []}
+    overrides = _get_overrides()
 
-    # Add new override
-    overrides["allowed_services"].append({
+    entry = {
+        "id": uuid.uuid4().hex,
         "domain": override.domain,
         "service": override.service,
         "reason": override.reason,
         "created_by": override.created_by,
         "created_at": datetime.now().isoformat(),
         "active": override.active
-    })
+    }
 
-    # Save overrides
-    with open(overrides_file, 'w') as f:
-        json.dump(overrides, f, indent=2)
+    # Append the new override instead of rewriting the whole file
+    _append_override_journal({"op": "add", "override": entry})
+    overrides.append(entry)
 
     # TODO: Push to OPA as data
     # curl -X PUT http://opa:8181/v1/data/overrides -d @overrides.json
@@ -206,36 +324,20 @@ async def create_override(override: PolicyOverride):
 @router.get("/api/overrides")
 async def list_overrides():
     """List all active admin overrides"""
-
-    overrides_file = Path("/app/data/overrides.json")
-
-    if overrides_file.exists():
-        with open(overrides_file, 'r') as f:
-            overrides = json.load(f)
-        return overrides
-    else:
-        return {"allowed_services": []}
+    return {"allowed_services": _get_overrides()}
 
 @router.delete("/api/overrides/{domain}")
 async def remove_override(domain: str):
     """Remove an admin override"""
+    global _overrides_cache
 
-    overrides_file = Path("/app/data/overrides.json")
-
-    if not overrides_file.exists():
+    if not OVERRIDES_FILE.exists() and not OVERRIDES_JOURNAL.exists():
         raise HTTPException(status_code=404, detail="No overrides found")
 
-    with open(overrides_file, 'r') as f:
-        overrides = json.load(f)
-
-    # Filter out the override
-    overrides["allowed_services"] = [
-        o for o in overrides["allowed_services"]
-        if o["domain"] != domain
-    ]
+    overrides = _get_overrides()
 
-    # Save
-    with open(overrides_file, 'w') as f:
-        json.dump(overrides, f, indent=2)
+    # Record a tombstone; compaction drops the removed entries from disk
+    _append_override_journal({"op": "remove", "domain": domain})
+    _overrides_cache = [o for o in overrides if o["domain"] != domain]
 
     return {"message": f"Override removed for {domain}"}
@@ -3,17 +3,28 @@ Zscaler Integration API
 Handles log ingestion, configuration, and analytics for Zscaler Internet Access (ZIA) and Private Access (ZPA)
 """
 
-from fastapi import APIRouter, HTTPException, Request, Header
+from fastapi import APIRouter, HTTPException, Request, Header, Query, Response
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+import asyncio
 import asyncpg
+import contextlib
 import hashlib
 import hmac
+import logging
+import orjson
 import os
+import time
+import uuid
+
+from app.cache import async_ttl_cache
+from app.lookups import get_ai_service_domains, get_user_departments
 
 router = APIRouter(prefix="/api/zscaler", tags=["Zscaler"])
 
+logger = logging.getLogger(__name__)
+
 # Global DB pool (set from main.py)
 db_pool = None
 
@@ -23,6 +34,53 @@ def set_db_pool(pool):
     db_pool = pool
 
 
+# Column order of the records built by store_web_logs
+ZSCALER_WEB_LOG_COLUMNS = [
+    "log_id", "timestamp", "user_email", "user_department", "user_location",
+    "url", "domain", "category", "action",
+    "threat_category", "threat_name", "risk_score",
+    "dlp_dictionaries", "dlp_engine", "file_type",
+    "application", "cloud_app",
+    "policy_name", "policy_reason",
+    "source_ip", "dest_ip",
+    "bytes_sent", "bytes_received",
+    "device_owner", "device_hostname",
+    "raw_log"
+]
+
+ZSCALER_AI_DETECTION_COLUMNS = [
+    "zscaler_log_id", "timestamp",
+    "user_email", "user_department",
+    "ai_service_domain", "ai_service_category",
+    "action_taken", "zscaler_policy",
+    "risk_level", "has_sensitive_data",
+    "dlp_violations", "metadata"
+]
+
+# Column order of the records built by store_zpa_logs
+ZSCALER_ZPA_LOG_COLUMNS = [
+    "timestamp", "user_email", "user_department",
+    "application_name", "application_id",
+    "connection_status", "connection_reason",
+    "policy_name", "policy_action",
+    "connector_group", "client_public_ip",
+    "bytes_tx", "bytes_rx",
+    "session_id", "session_duration",
+    "device_type", "os_type",
+    "raw_log"
+]
+
+# Throttle for the zscaler_config sync-status write
+SYNC_STATUS_INTERVAL = 10  # seconds
+SYNC_STATUS_MAX_PENDING = 1000  # logs
+_sync_pending_count = 0
+_sync_last_update = 0.0
+_sync_flush_task: Optional[asyncio.Task] = None
+
+# Webhook bodies larger than this are hashed and parsed off the event loop
+WEBHOOK_OFFLOAD_BYTES = 64 * 1024
+
+
 # ==========================================
 # DATA MODELS
 # ==========================================
@@ -117,29 +175,124 @@ class ZscalerStats(BaseModel):
 
 def verify_webhook_signature(payload: bytes, signature: str, secret: str) -> bool:
     """Verify Zscaler webhook signature"""
+    try:
+        provided_signature = bytes.fromhex(signature)
+    except ValueError:
+        return False
+
+    # Compare raw digests rather than their hex encodings
     expected_signature = hmac.new(
         secret.encode(),
         payload,
         hashlib.sha256
-    ).hexdigest()
-    return hmac.compare_digest(signature, expected_signature)
+    ).digest()
+    return hmac.compare_digest(provided_signature, expected_signature)
+
+
+@async_ttl_cache(ttl=60, maxsize=1)
+async def _load_webhook_secret() -> Optional[str]:
+    """Webhook secret of the enabled config; cleared when the config is saved"""
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval("""
+            SELECT webhook_secret_encrypted FROM zscaler_config WHERE enabled = TRUE LIMIT 1
+        """)
+
+
+async def copy_web_log_records(conn, log_records: list, detection_records: list):
+    """Write web logs and their AI detections with one COPY per table"""
+    await conn.copy_records_to_table(
+        "zscaler_web_logs",
+        records=log_records,
+        columns=ZSCALER_WEB_LOG_COLUMNS
+    )
+    if detection_records:
+        await conn.copy_records_to_table(
+            "zscaler_ai_detections",
+            records=detection_records,
+            columns=ZSCALER_AI_DETECTION_COLUMNS
+        )
+
+
+async def update_sync_status(conn, record_count: int):
+    """
+    Record a successful sync on the enabled Zscaler config.
+    Writes to the shared config row are throttled: counts accumulate in
+    process and are flushed every SYNC_STATUS_INTERVAL seconds or once
+    SYNC_STATUS_MAX_PENDING logs have been ingested, and by a background
+    flusher once ingestion goes quiet.
+    """
+    global _sync_pending_count
+
+    _sync_pending_count += record_count
+    now = time.monotonic()
+    if (now - _sync_last_update < SYNC_STATUS_INTERVAL
+            and _sync_pending_count < SYNC_STATUS_MAX_PENDING):
+        return
 
+    await _write_sync_status(conn)
 
-async def get_user_department(email: str) -> Optional[str]:
-    """Lookup user department from users table"""
-    if not db_pool or not email:
-        return None
+
+async def _write_sync_status(conn):
+    """Write the pending sync count to the enabled Zscaler config"""
+    global _sync_pending_count, _sync_last_update
+
+    # Claimed before the await so concurrent callers don't write it twice
+    record_count = _sync_pending_count
+    last_update = _sync_last_update
+    _sync_pending_count = 0
+    _sync_last_update = time.monotonic()
 
     try:
-        async with db_pool.acquire() as conn:
-            result = await conn.fetchval(
-                "SELECT department FROM users WHERE email = $1",
-                email
-            )
-            return result
-    except Exception as e:
-        print(f"Error looking up user department: {e}")
-        return None
+        await conn.execute("""
+            UPDATE zscaler_config
+            SET last_sync_timestamp = NOW(),
+                last_sync_status = 'success',
+                last_sync_record_count = $1
+            WHERE enabled = TRUE
+        """, record_count)
+    except Exception:
+        # Put the count back so the next write or flush includes it
+        _sync_pending_count += record_count
+        _sync_last_update = last_update
+        raise
+
+
+async def flush_sync_status():
+    """Write any sync count still held back by the throttle"""
+    if not db_pool or not _sync_pending_count:
+        return
+
+    async with db_pool.acquire() as conn:
+        await _write_sync_status(conn)
+
+
+async def _flush_sync_status_periodically():
+    """Flush throttled sync counts even when ingestion has gone quiet"""
+    while True:
+        await asyncio.sleep(SYNC_STATUS_INTERVAL)
+        try:
+            await flush_sync_status()
+        except Exception:
+            logger.exception("Error updating Zscaler sync status")
+
+
+def start_sync_status_flusher():
+    """Start the background task that flushes throttled sync counts"""
+    global _sync_flush_task
+    if _sync_flush_task is None:
+        _sync_flush_task = asyncio.create_task(_flush_sync_status_periodically())
+
+
+async def stop_sync_status_flusher():
+    """Stop the flusher and write whatever count is still pending"""
+    global _sync_flush_task
+    if _sync_flush_task:
+        _sync_flush_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _sync_flush_task
+        _sync_flush_task = None
+
+    await flush_sync_status()
 
 
 # ==========================================
@@ -190,6 +343,8 @@ async def configure_zscaler(config: ZscalerConfig):
                 config.enabled, config.log_types, config.sync_interval_minutes,
                 config.webhook_url, webhook_secret_encrypted)
 
+            _load_webhook_secret.cache.clear()
+
             return {
                 "success": True,
                 "message": "Zscaler configuration saved successfully",
@@ -387,6 +542,80 @@ async def test_zscaler_connection():
 # LOG INGESTION ENDPOINTS
 # ==========================================
 
+async def store_web_logs(logs: List[ZscalerWebLog]) -> Tuple[int, int]:
+    """Write web logs and their AI detections; returns (ingested_count, ai_detections)"""
+    log_records = []
+    detection_records = []
+
+    ai_domains = await get_ai_service_domains(db_pool)
+
+    async with db_pool.acquire() as conn:
+        # Resolve every user's department up front instead of once per log
+        departments = await get_user_departments(
+            conn, list({log.user_email for log in logs if log.user_email})
+        )
+
+        for log in logs:
+            department = departments.get(log.user_email)
+
+            # Generated here so AI detections can reference the log without RETURNING
+            log_id = uuid.uuid4()
+
+            # Serialized once and reused verbatim by both COPYs via the jsonb codec
+            raw_log = orjson.Fragment(orjson.dumps(log.raw_log)) if log.raw_log is not None else None
+
+            log_records.append((
+                log_id, log.timestamp, log.user_email, department, log.user_location,
+                log.url, log.domain, log.category, log.action,
+                log.threat_category, log.threat_name, log.risk_score,
+                log.dlp_dictionaries, log.dlp_engine, log.file_type,
+                log.application, log.cloud_app,
+                log.policy_name, log.policy_reason,
+                log.source_ip, log.dest_ip,
+                log.bytes_sent, log.bytes_received,
+                log.device_owner, log.device_hostname,
+                raw_log
+            ))
+
+            # Check if this is an AI service
+            if log.domain in ai_domains:
+                # Create AI detection record
+                risk_level = "low"
+                if log.risk_score:
+                    if log.risk_score >= 80:
+                        risk_level = "critical"
+                    elif log.risk_score >= 60:
+                        risk_level = "high"
+                    elif log.risk_score >= 40:
+                        risk_level = "medium"
+
+                detection_records.append((
+                    log_id, log.timestamp,
+                    log.user_email, department,
+                    log.domain, log.category,
+                    log.action, log.policy_name,
+                    risk_level, bool(log.dlp_dictionaries),
+                    log.dlp_dictionaries, raw_log
+                ))
+
+        ingested_count = len(log_records)
+        ai_detections = len(detection_records)
+
+        # Logs and detections commit together, so a failed batch leaves
+        # nothing behind for the sender's retry to duplicate
+        async with conn.transaction():
+            await copy_web_log_records(conn, log_records, detection_records)
+
+        # Counted only once the batch has committed. A failed status write
+        # keeps the count pending and must not fail the stored batch.
+        try:
+            await update_sync_status(conn, ingested_count)
+        except Exception:
+            logger.exception("Error updating Zscaler sync status")
+
+    return ingested_count, ai_detections
+
+
 @router.post("/ingest/web")
 async def ingest_web_logs(batch: ZscalerWebLogBatch):
     """
@@ -396,86 +625,7 @@ async def ingest_web_logs(batch: ZscalerWebLogBatch):
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        ingested_count = 0
-        ai_detections = 0
-
-        async with db_pool.acquire() as conn:
-            for log in batch.logs:
-                # Get user department
-                department = await get_user_department(log.user_email)
-
-                # Insert web log
-                log_id = await conn.fetchval("""
-                    INSERT INTO zscaler_web_logs (
-                        timestamp, user_email, user_department, user_location,
-                        url, domain, category, action,
-                        threat_category, threat_name, risk_score,
-                        dlp_dictionaries, dlp_engine, file_type,
-                        application, cloud_app,
-                        policy_name, policy_reason,
-                        source_ip, dest_ip,
-                        bytes_sent, bytes_received,
-                        device_owner, device_hostname,
-                        raw_log
-                    ) VALUES (
-                        $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14,
-                        $15, $16, $17, $18, $19, $20, $21, $22, $23, $24, $25
-                    ) RETURNING log_id
-                """, log.timestamp, log.user_email, department, log.user_location,
-                    log.url, log.domain, log.category, log.action,
-                    log.threat_category, log.threat_name, log.risk_score,
-                    log.dlp_dictionaries, log.dlp_engine, log.file_type,
-                    log.application, log.cloud_app,
-                    log.policy_name, log.policy_reason,
-                    log.source_ip, log.dest_ip,
-                    log.bytes_sent, log.bytes_received,
-                    log.device_owner, log.device_hostname,
-                    log.raw_log)
-
-                ingested_count += 1
-
-                # Check if this is an AI service
-                is_ai_service = await conn.fetchval("""
-                    SELECT EXISTS (SELECT 1 FROM ai_services WHERE domain = $1)
-                """, log.domain)
-
-                if is_ai_service:
-                    # Create AI detection record
-                    risk_level = "low"
-                    if log.risk_score:
-                        if log.risk_score >= 80:
-                            risk_level = "critical"
-                        elif log.risk_score >= 60:
-                            risk_level = "high"
-                        elif log.risk_score >= 40:
-                            risk_level = "medium"
-
-                    await conn.execute("""
-                        INSERT INTO zscaler_ai_detections (
-                            zscaler_log_id, timestamp,
-                            user_email, user_department,
-                            ai_service_domain, ai_service_category,
-                            action_taken, zscaler_policy,
-                            risk_level, has_sensitive_data,
-                            dlp_violations, metadata
-                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-                    """, log_id, log.timestamp,
-                        log.user_email, department,
-                        log.domain, log.category,
-                        log.action, log.policy_name,
-                        risk_level, bool(log.dlp_dictionaries),
-                        log.dlp_dictionaries, log.raw_log)
-
-                    ai_detections += 1
-
-            # Update sync status
-            await conn.execute("""
-                UPDATE zscaler_config
-                SET last_sync_timestamp = NOW(),
-                    last_sync_status = 'success',
-                    last_sync_record_count = $1
-                WHERE enabled = TRUE
-            """, ingested_count)
+        ingested_count, ai_detections = await store_web_logs(batch.logs)
 
         return {
             "success": True,
@@ -485,10 +635,46 @@ async def ingest_web_logs(batch: ZscalerWebLogBatch):
         }
 
     except Exception as e:
-        print(f"Error ingesting web logs: {e}")
+        logger.exception("Error ingesting web logs")
         raise HTTPException(status_code=500, detail=f"Failed to ingest logs: {str(e)}")
 
 
+async def store_zpa_logs(logs: List[ZscalerZPALog]) -> int:
+    """Write ZPA logs; returns the number ingested"""
+    async with db_pool.acquire() as conn:
+        # Resolve every user's department up front instead of once per log
+        departments = await get_user_departments(
+            conn, list({log.user_email for log in logs if log.user_email})
+        )
+
+        records = [
+            (
+                log.timestamp, log.user_email, departments.get(log.user_email),
+                log.application_name, log.application_id,
+                log.connection_status, log.connection_reason,
+                log.policy_name, log.policy_action,
+                log.connector_group, log.client_public_ip,
+                log.bytes_tx, log.bytes_rx,
+                log.session_id, log.session_duration,
+                log.device_type, log.os_type,
+                log.raw_log
+            )
+            for log in logs
+        ]
+
+        # Stream the whole batch in one binary COPY instead of an INSERT per log
+        async with conn.transaction():
+            await conn.copy_records_to_table(
+                "zscaler_zpa_logs",
+                records=records,
+                columns=ZSCALER_ZPA_LOG_COLUMNS
+            )
+
+        ingested_count = len(records)
+
+    return ingested_count
+
+
 @router.post("/ingest/zpa")
 async def ingest_zpa_logs(batch: ZscalerZPALogBatch):
     """
@@ -498,39 +684,7 @@ async def ingest_zpa_logs(batch: ZscalerZPALogBatch):
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        ingested_count = 0
-
-        async with db_pool.acquire() as conn:
-            for log in batch.logs:
-                # Get user department
-                department = await get_user_department(log.user_email)
-
-                # Insert ZPA log
-                await conn.execute("""
-                    INSERT INTO zscaler_zpa_logs (
-                        timestamp, user_email, user_department,
-                        application_name, application_id,
-                        connection_status, connection_reason,
-                        policy_name, policy_action,
-                        connector_group, client_public_ip,
-                        bytes_tx, bytes_rx,
-                        session_id, session_duration,
-                        device_type, os_type,
-                        raw_log
-                    ) VALUES (
-                        $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18
-                    )
-                """, log.timestamp, log.user_email, department,
-                    log.application_name, log.application_id,
-                    log.connection_status, log.connection_reason,
-                    log.policy_name, log.policy_action,
-                    log.connector_group, log.client_public_ip,
-                    log.bytes_tx, log.bytes_rx,
-                    log.session_id, log.session_duration,
-                    log.device_type, log.os_type,
-                    log.raw_log)
-
-                ingested_count += 1
+        ingested_count = await store_zpa_logs(batch.logs)
 
         return {
             "success": True,
@@ -539,10 +693,43 @@ async def ingest_zpa_logs(batch: ZscalerZPALogBatch):
         }
 
     except Exception as e:
-        print(f"Error ingesting ZPA logs: {e}")
+        logger.exception("Error ingesting ZPA logs")
         raise HTTPException(status_code=500, detail=f"Failed to ingest logs: {str(e)}")
 
 
+def construct_trusted_logs(model, logs: List[Dict[str, Any]]) -> list:
+    """
+    Build log models from a signature-verified webhook without validating fields.
+    Only the ISO-8601 timestamp is converted, since COPY needs a datetime.
+    """
+    trusted_logs = []
+    for log in logs:
+        timestamp = log.get("timestamp")
+        if isinstance(timestamp, str):
+            log = {**log, "timestamp": datetime.fromisoformat(timestamp)}
+        trusted_logs.append(model.model_construct(**log))
+    return trusted_logs
+
+
+async def store_webhook_logs(store, model, batch_model, logs: List[Dict[str, Any]], verified: bool):
+    """
+    Store webhook logs, skipping validation for signature-verified payloads.
+    The unvalidated fast path can still trip over a missing field or a value
+    COPY cannot encode (epoch timestamps, numbers sent as strings); writes are
+    transactional, so on any failure the payload is validated and stored again.
+    """
+    if verified:
+        try:
+            return await store(construct_trusted_logs(model, logs))
+        except Exception:
+            logger.warning(
+                "Unvalidated %s payload could not be stored, retrying with validation",
+                model.__name__, exc_info=True
+            )
+
+    return await store(batch_model(logs=logs).logs)
+
+
 @router.post("/webhook")
 async def zscaler_webhook(request: Request, x_zscaler_signature: Optional[str] = Header(None)):
     """
@@ -552,36 +739,61 @@ async def zscaler_webhook(request: Request, x_zscaler_signature: Optional[str] =
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        # Get webhook secret
-        async with db_pool.acquire() as conn:
-            webhook_secret = await conn.fetchval("""
-                SELECT webhook_secret_encrypted FROM zscaler_config WHERE enabled = TRUE LIMIT 1
-            """)
+        # Get webhook secret (cached, so a push needs no extra round-trip)
+        webhook_secret = await _load_webhook_secret()
+
+        body = await request.body()
+        verified = False
 
         # Verify signature if secret is configured
         if webhook_secret and x_zscaler_signature:
-            body = await request.body()
-            if not verify_webhook_signature(body, x_zscaler_signature, webhook_secret):
+            # Hash large payloads on a worker thread so the event loop keeps serving
+            if len(body) > WEBHOOK_OFFLOAD_BYTES:
+                valid = await asyncio.to_thread(
+                    verify_webhook_signature, body, x_zscaler_signature, webhook_secret
+                )
+            else:
+                valid = verify_webhook_signature(body, x_zscaler_signature, webhook_secret)
+            if not valid:
                 raise HTTPException(status_code=401, detail="Invalid webhook signature")
+            verified = True
 
-        # Parse webhook payload
-        payload = await request.json()
+        # Parse webhook payload straight from the raw bytes
+        if len(body) > WEBHOOK_OFFLOAD_BYTES:
+            payload = await asyncio.to_thread(orjson.loads, body)
+        else:
+            payload = orjson.loads(body)
         log_type = payload.get("type", "web")
         logs = payload.get("logs", [])
 
+        # Signed payloads come from Zscaler itself and skip field validation;
+        # anything else is validated once before being written
         if log_type == "web":
-            batch = ZscalerWebLogBatch(logs=logs)
-            result = await ingest_web_logs(batch)
+            ingested_count, ai_detections = await store_webhook_logs(
+                store_web_logs, ZscalerWebLog, ZscalerWebLogBatch, logs, verified
+            )
+            return {
+                "success": True,
+                "ingested_count": ingested_count,
+                "ai_detections": ai_detections,
+                "message": f"Successfully ingested {ingested_count} web logs"
+            }
         elif log_type == "zpa":
-            batch = ZscalerZPALogBatch(logs=logs)
-            result = await ingest_zpa_logs(batch)
+            ingested_count = await store_webhook_logs(
+                store_zpa_logs, ZscalerZPALog, ZscalerZPALogBatch, logs, verified
+            )
+            return {
+                "success": True,
+                "ingested_count": ingested_count,
+                "message": f"Successfully ingested {ingested_count} ZPA logs"
+            }
         else:
             raise HTTPException(status_code=400, detail=f"Unknown log type: {log_type}")
 
-        return result
-
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing webhook: {e}")
+        logger.exception("Error processing webhook")
         raise HTTPException(status_code=500, detail=f"Failed to process webhook: {str(e)}")
 
 
@@ -589,6 +801,36 @@ async def zscaler_webhook(request: Request, x_zscaler_signature: Optional[str] =
 # ANALYTICS ENDPOINTS
 # ==========================================
 
+# Counts come from the zscaler_stats_30d materialized view (refreshed every
+# 15 minutes); the last sync time is read live
+ZSCALER_STATS_SQL = """
+    SELECT
+        s.web_logs_count,
+        s.zpa_logs_count,
+        s.ai_detections_count,
+        s.blocked_requests,
+        s.dlp_incidents,
+        s.unique_users,
+        (SELECT last_sync_timestamp FROM zscaler_config
+         WHERE enabled = TRUE
+         ORDER BY last_sync_timestamp DESC
+         LIMIT 1) AS last_sync
+    FROM zscaler_stats_30d s
+"""
+
+
+@async_ttl_cache(ttl=30, maxsize=1)
+async def _load_zscaler_stats() -> ZscalerStats:
+    """Dashboard stats; cached briefly so concurrent polls share one query"""
+    async with db_pool.acquire() as conn:
+        stats = await conn.fetchrow(ZSCALER_STATS_SQL)
+
+    return ZscalerStats(
+        total_logs_ingested=stats["web_logs_count"] + stats["zpa_logs_count"],
+        **stats
+    )
+
+
 @router.get("/stats", response_model=ZscalerStats)
 async def get_zscaler_stats():
     """
@@ -598,64 +840,27 @@ async def get_zscaler_stats():
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        async with db_pool.acquire() as conn:
-            # Web logs count
-            web_logs_count = await conn.fetchval("""
-                SELECT COUNT(*) FROM zscaler_web_logs
-                WHERE timestamp > NOW() - INTERVAL '30 days'
-            """)
+        return await _load_zscaler_stats()
 
-            # ZPA logs count
-            zpa_logs_count = await conn.fetchval("""
-                SELECT COUNT(*) FROM zscaler_zpa_logs
-                WHERE timestamp > NOW() - INTERVAL '30 days'
-            """)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve stats: {str(e)}")
 
-            # AI detections count
-            ai_detections_count = await conn.fetchval("""
-                SELECT COUNT(*) FROM zscaler_ai_detections
-                WHERE timestamp > NOW() - INTERVAL '30 days'
-            """)
 
-            # Blocked requests
-            blocked_requests = await conn.fetchval("""
-                SELECT COUNT(*) FROM zscaler_web_logs
-                WHERE action = 'Blocked' AND timestamp > NOW() - INTERVAL '30 days'
-            """)
+def json_array_sql(query: str) -> str:
+    """Wrap a query so Postgres returns its rows as one JSON array string"""
+    return f"SELECT COALESCE(json_agg(t), '[]')::text FROM ({query}) t"
 
-            # DLP incidents
-            dlp_incidents = await conn.fetchval("""
-                SELECT COUNT(*) FROM zscaler_web_logs
-                WHERE dlp_dictionaries IS NOT NULL AND timestamp > NOW() - INTERVAL '30 days'
-            """)
 
-            # Unique users
-            unique_users = await conn.fetchval("""
-                SELECT COUNT(DISTINCT user_email) FROM zscaler_web_logs
-                WHERE timestamp > NOW() - INTERVAL '30 days' AND user_email IS NOT NULL
-            """)
-
-            # Last sync
-            last_sync = await conn.fetchval("""
-                SELECT last_sync_timestamp FROM zscaler_config
-                WHERE enabled = TRUE
-                ORDER BY last_sync_timestamp DESC
-                LIMIT 1
-            """)
-
-            return ZscalerStats(
-                total_logs_ingested=web_logs_count + zpa_logs_count,
-                web_logs_count=web_logs_count,
-                zpa_logs_count=zpa_logs_count,
-                ai_detections_count=ai_detections_count,
-                blocked_requests=blocked_requests,
-                dlp_incidents=dlp_incidents,
-                unique_users=unique_users,
-                last_sync=last_sync
-            )
+@async_ttl_cache(ttl=30, maxsize=1)
+async def _load_ai_usage() -> bytes:
+    """AI usage summary as JSON; cached briefly so concurrent polls share one query"""
+    async with db_pool.acquire() as conn:
+        usage = await conn.fetchval(json_array_sql("""
+            SELECT * FROM zscaler_ai_usage_summary
+            LIMIT 50
+        """))
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve stats: {str(e)}")
+    return usage.encode()
 
 
 @router.get("/ai-usage")
@@ -667,18 +872,23 @@ async def get_ai_usage_from_zscaler():
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        async with db_pool.acquire() as conn:
-            usage = await conn.fetch("""
-                SELECT * FROM zscaler_ai_usage_summary
-                LIMIT 50
-            """)
-
-            return [dict(row) for row in usage]
+        return Response(await _load_ai_usage(), media_type="application/json")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve AI usage: {str(e)}")
 
 
+@async_ttl_cache(ttl=30, maxsize=1)
+async def _load_top_blocks() -> bytes:
+    """Top blocked categories as JSON; cached briefly so concurrent polls share one query"""
+    async with db_pool.acquire() as conn:
+        blocks = await conn.fetchval(json_array_sql("""
+            SELECT * FROM zscaler_top_blocks
+        """))
+
+    return blocks.encode()
+
+
 @router.get("/top-blocks")
 async def get_top_blocks():
     """
@@ -688,19 +898,26 @@ async def get_top_blocks():
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        async with db_pool.acquire() as conn:
-            blocks = await conn.fetch("""
-                SELECT * FROM zscaler_top_blocks
-            """)
-
-            return [dict(row) for row in blocks]
+        return Response(await _load_top_blocks(), media_type="application/json")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve top blocks: {str(e)}")
 
 
+@async_ttl_cache(ttl=30)
+async def _load_dlp_incidents(limit: int) -> bytes:
+    """Recent DLP incidents per limit as JSON; cached briefly so concurrent polls share one query"""
+    async with db_pool.acquire() as conn:
+        incidents = await conn.fetchval(json_array_sql("""
+            SELECT * FROM zscaler_dlp_incidents
+            LIMIT $1
+        """), limit)
+
+    return incidents.encode()
+
+
 @router.get("/dlp-incidents")
-async def get_dlp_incidents(limit: int = 50):
+async def get_dlp_incidents(limit: int = Query(50, ge=1, le=1000)):
     """
     Get recent DLP incidents from Zscaler
     """
@@ -708,13 +925,7 @@ async def get_dlp_incidents(limit: int = 50):
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        async with db_pool.acquire() as conn:
-            incidents = await conn.fetch("""
-                SELECT * FROM zscaler_dlp_incidents
-                LIMIT $1
-            """, limit)
-
-            return [dict(row) for row in incidents]
+        return Response(await _load_dlp_incidents(limit), media_type="application/json")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve DLP incidents: {str(e)}")
@@ -5,6 +5,7 @@ Supports Okta and Microsoft Entra ID (Azure AD)
 
 from typing import Dict, Optional, List
 from datetime import datetime, timedelta
+import hmac
 import httpx
 import jwt
 from jwt import PyJWKClient
@@ -14,6 +15,45 @@ from functools import wraps
 import asyncio
 
 
+# Shared by every provider's sync_user; returns the stored row
+UPSERT_USER_SQL = """
+    INSERT INTO users (
+        user_id, email, first_name, last_name,
+        department, groups, iam_provider, iam_synced_at
+    )
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT (email)
+    DO UPDATE SET
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        department = EXCLUDED.department,
+        groups = EXCLUDED.groups,
+        iam_synced_at = EXCLUDED.iam_synced_at
+    RETURNING *
+"""
+
+# Signing keys rotate rarely; keep the JWK set for an hour
+JWKS_CACHE_LIFESPAN = 3600
+
+
+def make_jwks_client(jwks_uri: str) -> PyJWKClient:
+    """JWKS client that caches the key set and resolved signing keys by kid"""
+    return PyJWKClient(
+        jwks_uri,
+        cache_keys=True,
+        max_cached_keys=16,
+        lifespan=JWKS_CACHE_LIFESPAN
+    )
+
+
+def make_http_client() -> httpx.AsyncClient:
+    """Long-lived client so IdP and Graph calls reuse pooled keep-alive connections"""
+    return httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+    )
+
+
 class OktaProvider:
     """Okta SAML/OAuth Integration"""
 
@@ -24,7 +64,8 @@ class OktaProvider:
         self.api_token = os.getenv("OKTA_API_TOKEN")  # For user/group sync
         self.issuer = f"https://{self.domain}/oauth2/default"
         self.jwks_uri = f"{self.issuer}/v1/keys"
-        self.jwks_client = PyJWKClient(self.jwks_uri) if self.domain else None
+        self.jwks_client = make_jwks_client(self.jwks_uri) if self.domain else None
+        self.http_client = make_http_client()
 
     async def verify_token(self, token: str) -> Dict:
         """Verify Okta JWT token"""
@@ -59,61 +100,50 @@ class OktaProvider:
         if not self.api_token:
             raise HTTPException(status_code=500, detail="Okta API token not configured")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://{self.domain}/api/v1/users/{user_id}",
-                headers={"Authorization": f"SSWS {self.api_token}"}
-            )
-            response.raise_for_status()
-            user_data = response.json()
-
-            return {
-                "user_id": user_data["id"],
-                "email": user_data["profile"]["email"],
-                "first_name": user_data["profile"]["firstName"],
-                "last_name": user_data["profile"]["lastName"],
-                "department": user_data["profile"].get("department"),
-                "status": user_data["status"],
-                "created": user_data["created"],
-                "last_login": user_data.get("lastLogin")
-            }
+        response = await self.http_client.get(
+            f"https://{self.domain}/api/v1/users/{user_id}",
+            headers={"Authorization": f"SSWS {self.api_token}"}
+        )
+        response.raise_for_status()
+        user_data = response.json()
+
+        return {
+            "user_id": user_data["id"],
+            "email": user_data["profile"]["email"],
+            "first_name": user_data["profile"]["firstName"],
+            "last_name": user_data["profile"]["lastName"],
+            "department": user_data["profile"].get("department"),
+            "status": user_data["status"],
+            "created": user_data["created"],
+            "last_login": user_data.get("lastLogin")
+        }
 
     async def get_user_groups(self, user_id: str) -> List[str]:
         """Fetch user's group memberships from Okta"""
         if not self.api_token:
             return []
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://{self.domain}/api/v1/users/{user_id}/groups",
-                headers={"Authorization": f"SSWS {self.api_token}"}
-            )
-            response.raise_for_status()
-            groups = response.json()
+        response = await self.http_client.get(
+            f"https://{self.domain}/api/v1/users/{user_id}/groups",
+            headers={"Authorization": f"SSWS {self.api_token}"}
+        )
+        response.raise_for_status()
+        groups = response.json()
 
-            return [group["profile"]["name"] for group in groups]
+        return [group["profile"]["name"] for group in groups]
 
     async def sync_user(self, user_id: str, db_pool) -> Dict:
-        """Sync user from Okta to local database"""
-        user_info = await self.get_user_info(user_id)
-        groups = await self.get_user_groups(user_id)
+        """Sync user from Okta to local database and return the stored row"""
+        # Profile and groups are independent lookups, so fetch them concurrently
+        user_info, groups = await asyncio.gather(
+            self.get_user_info(user_id),
+            self.get_user_groups(user_id)
+        )
 
-        # Store in database
+        # Store in database; the stored row comes back in the same round-trip
         async with db_pool.acquire() as conn:
-            await conn.execute("""
-                INSERT INTO users (
-                    user_id, email, first_name, last_name,
-                    department, groups, iam_provider, iam_synced_at
-                )
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                ON CONFLICT (email)
-                DO UPDATE SET
-                    first_name = EXCLUDED.first_name,
-                    last_name = EXCLUDED.last_name,
-                    department = EXCLUDED.department,
-                    groups = EXCLUDED.groups,
-                    iam_synced_at = EXCLUDED.iam_synced_at
-            """,
+            user_record = await conn.fetchrow(
+                UPSERT_USER_SQL,
                 user_id,
                 user_info["email"],
                 user_info["first_name"],
@@ -124,7 +154,7 @@ class OktaProvider:
                 datetime.utcnow()
             )
 
-        return {**user_info, "groups": groups}
+        return dict(user_record)
 
 
 class EntraIDProvider:
@@ -137,9 +167,11 @@ class EntraIDProvider:
         self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
         self.graph_endpoint = "https://graph.microsoft.com/v1.0"
         self.jwks_uri = f"{self.authority}/discovery/v2.0/keys"
-        self.jwks_client = PyJWKClient(self.jwks_uri) if self.tenant_id else None
+        self.jwks_client = make_jwks_client(self.jwks_uri) if self.tenant_id else None
+        self.http_client = make_http_client()
         self._access_token = None
         self._token_expires = None
+        self._token_lock = asyncio.Lock()
 
     async def verify_token(self, token: str) -> Dict:
         """Verify Entra ID JWT token"""
@@ -169,13 +201,25 @@ class EntraIDProvider:
         except jwt.InvalidTokenError as e:
             raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
-    async def _get_access_token(self) -> str:
-        """Get Microsoft Graph API access token"""
+    def _cached_access_token(self) -> Optional[str]:
+        """Return the Graph token if it is still valid"""
         if self._access_token and self._token_expires and datetime.utcnow() < self._token_expires:
             return self._access_token
+        return None
+
+    async def _get_access_token(self) -> str:
+        """Get Microsoft Graph API access token"""
+        token = self._cached_access_token()
+        if token:
+            return token
+
+        # Only one coroutine refreshes; the rest wait and reuse its token
+        async with self._token_lock:
+            token = self._cached_access_token()
+            if token:
+                return token
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+            response = await self.http_client.post(
                 f"{self.authority}/oauth2/v2.0/token",
                 data={
                     "client_id": self.client_id,
@@ -196,64 +240,52 @@ class EntraIDProvider:
         """Fetch user details from Microsoft Graph API"""
         token = await self._get_access_token()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.graph_endpoint}/users/{user_id}",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            user_data = response.json()
-
-            return {
-                "user_id": user_data["id"],
-                "email": user_data["mail"] or user_data["userPrincipalName"],
-                "first_name": user_data.get("givenName"),
-                "last_name": user_data.get("surname"),
-                "department": user_data.get("department"),
-                "job_title": user_data.get("jobTitle"),
-                "office_location": user_data.get("officeLocation"),
-                "created": user_data.get("createdDateTime")
-            }
+        response = await self.http_client.get(
+            f"{self.graph_endpoint}/users/{user_id}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        user_data = response.json()
+
+        return {
+            "user_id": user_data["id"],
+            "email": user_data["mail"] or user_data["userPrincipalName"],
+            "first_name": user_data.get("givenName"),
+            "last_name": user_data.get("surname"),
+            "department": user_data.get("department"),
+            "job_title": user_data.get("jobTitle"),
+            "office_location": user_data.get("officeLocation"),
+            "created": user_data.get("createdDateTime")
+        }
 
     async def get_user_groups(self, user_id: str) -> List[str]:
         """Fetch user's group memberships from Entra ID"""
         token = await self._get_access_token()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.graph_endpoint}/users/{user_id}/memberOf",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            groups_data = response.json()
+        response = await self.http_client.get(
+            f"{self.graph_endpoint}/users/{user_id}/memberOf",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        groups_data = response.json()
 
-            return [
-                group["displayName"]
-                for group in groups_data.get("value", [])
-                if group.get("@odata.type") == "#microsoft.graph.group"
-            ]
+        return [
+            group["displayName"]
+            for group in groups_data.get("value", [])
+            if group.get("@odata.type") == "#microsoft.graph.group"
+        ]
 
     async def sync_user(self, user_id: str, db_pool) -> Dict:
-        """Sync user from Entra ID to local database"""
-        user_info = await self.get_user_info(user_id)
-        groups = await self.get_user_groups(user_id)
+        """Sync user from Entra ID to local database and return the stored row"""
+        user_info, groups = await asyncio.gather(
+            self.get_user_info(user_id),
+            self.get_user_groups(user_id)
+        )
 
-        # Store in database
+        # Store in database; the stored row comes back in the same round-trip
         async with db_pool.acquire() as conn:
-            await conn.execute("""
-                INSERT INTO users (
-                    user_id, email, first_name, last_name,
-                    department, groups, iam_provider, iam_synced_at
-                )
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                ON CONFLICT (email)
-                DO UPDATE SET
-                    first_name = EXCLUDED.first_name,
-                    last_name = EXCLUDED.last_name,
-                    department = EXCLUDED.department,
-                    groups = EXCLUDED.groups,
-                    iam_synced_at = EXCLUDED.iam_synced_at
-            """,
+            user_record = await conn.fetchrow(
+                UPSERT_USER_SQL,
                 user_id,
                 user_info["email"],
                 user_info["first_name"],
@@ -264,7 +296,7 @@ class EntraIDProvider:
                 datetime.utcnow()
             )
 
-        return {**user_info, "groups": groups}
+        return dict(user_record)
 
 
 class IAMManager:
@@ -274,6 +306,16 @@ class IAMManager:
         self.okta = OktaProvider()
         self.entra_id = EntraIDProvider()
         self.enabled_providers = self._get_enabled_providers()
+        # Providers are configured from the environment, so resolve the flags once
+        self.okta_enabled = "okta" in self.enabled_providers
+        self.entra_id_enabled = "entra_id" in self.enabled_providers
+
+        # Token issuer -> provider, for routing tokens without trying each one
+        self._issuer_providers = {}
+        if self.okta_enabled:
+            self._issuer_providers[self.okta.issuer] = self.okta
+        if self.entra_id_enabled:
+            self._issuer_providers[f"{self.entra_id.authority}/v2.0"] = self.entra_id
 
     def _get_enabled_providers(self) -> List[str]:
         """Determine which IAM providers are configured"""
@@ -286,12 +328,21 @@ class IAMManager:
 
     async def verify_token(self, token: str, provider: Optional[str] = None) -> Dict:
         """Verify token from any configured provider"""
-        if provider == "okta" and "okta" in self.enabled_providers:
+        if provider == "okta" and self.okta_enabled:
             return await self.okta.verify_token(token)
-        elif provider == "entra_id" and "entra_id" in self.enabled_providers:
+        elif provider == "entra_id" and self.entra_id_enabled:
             return await self.entra_id.verify_token(token)
 
-        # Try all providers if not specified
+        # Route straight to the provider that issued the token
+        try:
+            issuer = jwt.decode(token, options={"verify_signature": False}).get("iss")
+        except jwt.InvalidTokenError:
+            issuer = None
+        issuer_provider = self._issuer_providers.get(issuer)
+        if issuer_provider:
+            return await issuer_provider.verify_token(token)
+
+        # Unknown issuer: try all providers
         errors = []
         for prov in self.enabled_providers:
             try:
@@ -320,11 +371,27 @@ class IAMManager:
         """Return list of enabled IAM providers"""
         return self.enabled_providers
 
+    async def aclose(self):
+        """Close the providers' HTTP clients"""
+        await self.okta.http_client.aclose()
+        await self.entra_id.http_client.aclose()
+
 
 # Global IAM manager instance
 iam_manager = IAMManager()
 
 
+# Plugin API key, read once at startup and compared in constant time
+API_KEY = os.getenv("API_KEY", "").encode() or None
+
+# Identity returned for every request authenticated by API key
+API_KEY_USER = {
+    "email": "api_user@system",
+    "auth_method": "api_key",
+    "provider": "system"
+}
+
+
 # Dependency for FastAPI routes
 async def get_current_user(
     authorization: Optional[str] = Header(None),
@@ -336,13 +403,8 @@ async def get_current_user(
     """
     # Check for API key (for browser/IDE plugins)
     if x_api_key:
-        expected_key = os.getenv("API_KEY")
-        if expected_key and x_api_key == expected_key:
-            return {
-                "email": "api_user@system",
-                "auth_method": "api_key",
-                "provider": "system"
-            }
+        if API_KEY and hmac.compare_digest(x_api_key.encode(), API_KEY):
+            return API_KEY_USER
         raise HTTPException(status_code=401, detail="Invalid API key")
 
     # Check for Bearer token (IAM authentication)
@@ -0,0 +1,51 @@
+"""
+In-process TTL caching
+Short-lived caches for dashboard endpoints that are polled frequently
+"""
+
+from typing import Any, Callable, Dict
+from functools import wraps
+import asyncio
+
+from cachetools import TTLCache
+
+
+def async_ttl_cache(ttl: float, maxsize: int = 32) -> Callable:
+    """
+    Cache an async function's result per positional-argument tuple for ttl seconds
+
+    Concurrent callers for a missing or expired key wait on a single
+    recomputation instead of all hitting the backend at once.
+    """
+    def decorator(func: Callable) -> Callable:
+        cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        locks: Dict[Any, asyncio.Lock] = {}
+
+        @wraps(func)
+        async def wrapper(*args):
+            try:
+                return cache[args]
+            except KeyError:
+                pass
+
+            lock = locks.setdefault(args, asyncio.Lock())
+            try:
+                async with lock:
+                    try:
+                        return cache[args]
+                    except KeyError:
+                        pass
+
+                    value = await func(*args)
+                    cache[args] = value
+                    return value
+            finally:
+                # Locks only live while a recomputation is in flight, so keyed
+                # callers don't leave one behind per distinct argument tuple
+                if locks.get(args) is lock:
+                    del locks[args]
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -7,8 +7,14 @@ from typing import Dict, List, Optional, Set, Any
 from enum import Enum
 from pydantic import BaseModel
 from datetime import datetime, timedelta
+from collections import deque
 import hashlib
+import itertools
 import json
+import orjson
+
+# Incidents are kept in memory; cap them so long-running instances stay bounded
+MAX_INCIDENTS = 10000
 
 
 class ThreatLevel(str, Enum):
@@ -83,6 +89,9 @@ class RedTeamReport(BaseModel):
     successful_attacks: int
     recommendations: List[str]
     trending_threats: List[str]
+    # Set when older incidents in the period were evicted by MAX_INCIDENTS and
+    # the report only covers the most recent ones
+    incidents_truncated: bool = False
 
 
 class AIRedTeam:
@@ -94,7 +103,13 @@ class AIRedTeam:
     def __init__(self):
         self.attack_vectors: Dict[str, AttackVector] = {}
         self.threat_intel: List[ThreatIntelligence] = []
-        self.incidents: List[SecurityIncident] = []
+        # Appended in chronological order, so the newest incident is always last
+        self.incidents: deque = deque(maxlen=MAX_INCIDENTS)
+        # Pre-serialized summaries of the same incidents for the listing endpoint
+        self.incident_summaries: deque = deque(maxlen=MAX_INCIDENTS)
+        # Lifetime count; the deques above keep only the newest MAX_INCIDENTS
+        self.total_incidents = 0
+        self._incident_sequence = itertools.count(1)
         self.blocked_patterns: Set[str] = set()
 
         # Initialize known attack vectors
@@ -351,6 +366,18 @@ class AIRedTeam:
         )
 
         self.incidents.append(incident)
+        self.total_incidents += 1
+        # Incidents are immutable once logged, so serialize the summary only once
+        self.incident_summaries.append(orjson.Fragment(orjson.dumps({
+            "incident_id": incident.incident_id,
+            "timestamp": incident.timestamp,
+            "user_email": incident.user_email,
+            "threat_category": incident.threat_category.value,
+            "threat_level": incident.threat_level.value,
+            "attack_vector": incident.attack_vector,
+            "blocked": incident.blocked,
+            "investigation_status": incident.investigation_status
+        })))
         return incident
 
     def get_threat_report(
@@ -370,6 +397,12 @@ class AIRedTeam:
         if not end_date:
             end_date = datetime.utcnow()
 
+        # Incidents older than the oldest retained one have been evicted
+        incidents_truncated = (
+            self.total_incidents > len(self.incidents)
+            and self.incidents[0].timestamp > start_date
+        )
+
         # Filter incidents by date range
         period_incidents = [
             inc for inc in self.incidents
@@ -422,7 +455,8 @@ class AIRedTeam:
             blocked_attacks=blocked_attacks,
             successful_attacks=successful_attacks,
             recommendations=recommendations,
-            trending_threats=trending
+            trending_threats=trending,
+            incidents_truncated=incidents_truncated
         )
 
     def _generate_recommendations(self, incidents: List[SecurityIncident]) -> List[str]:
@@ -484,7 +518,9 @@ class AIRedTeam:
 
     def _generate_incident_id(self) -> str:
         """Generate unique incident ID"""
-        data = f"{len(self.incidents)}_{datetime.utcnow().isoformat()}"
+        # The sequence keeps ids unique even within one clock tick, which
+        # len(self.incidents) stops doing once the buffer is full
+        data = f"{next(self._incident_sequence)}_{datetime.utcnow().isoformat()}"
         return f"INC-{hashlib.sha256(data.encode()).hexdigest()[:12].upper()}"
 
     def _generate_report_id(self) -> str:
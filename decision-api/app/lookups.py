@@ -0,0 +1,47 @@
+"""
+Shared lookups for log ingestion
+User departments and the AI service catalog, used by the Zscaler and Netskope routers
+"""
+
+from typing import Dict, FrozenSet, List, Optional
+import logging
+
+from app.cache import async_ttl_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def get_user_departments(conn, emails: List[str]) -> Dict[str, Optional[str]]:
+    """Lookup departments for many users with a single query"""
+    if not emails:
+        return {}
+
+    try:
+        rows = await conn.fetch(
+            "SELECT email, department FROM users WHERE email = ANY($1::text[])",
+            emails
+        )
+        return {row["email"]: row["department"] for row in rows}
+    except Exception as e:
+        logger.exception("Error looking up user departments")
+        return {}
+
+
+@async_ttl_cache(ttl=60, maxsize=1)
+async def _load_ai_service_domains(pool) -> FrozenSet[str]:
+    """Load the AI service catalog; it rarely changes, so keep it for a minute"""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT domain FROM ai_services")
+    return frozenset(row["domain"] for row in rows)
+
+
+async def get_ai_service_domains(pool) -> FrozenSet[str]:
+    """Return the domains of all known AI services"""
+    if not pool:
+        return frozenset()
+
+    try:
+        return await _load_ai_service_domains(pool)
+    except Exception as e:
+        logger.exception("Error loading AI services")
+        return frozenset()